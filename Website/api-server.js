@@ -263,7 +263,7 @@ app.get('/api/canvas/:username/stats/summary', async (req, res) => {
 // Stream AI chat responses (proxy to Python API)
 app.post('/api/chat/stream', async (req, res) => {
   try {
-    const { messages, canvasId, username } = req.body;
+    const { messages, canvasId, username, regenerate } = req.body;
     
     // Get current canvas
     const canvasResult = await getCanvas(canvasId, username);
@@ -305,6 +305,7 @@ app.post('/api/chat/stream', async (req, res) => {
         current_canvas: canvasResult.canvas.script,
         data_sources: detailedFiles,
         username: username,  // Pass username for token tracking
+        regenerate: Boolean(regenerate),  // Explicit retry - skip the cached response
       }),
     });
     
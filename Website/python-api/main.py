@@ -1,27 +1,64 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any, AsyncIterator
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import Optional, List, Dict, Any, AsyncIterator, IO, Tuple
 import uvicorn
+import aiohttp
+import asyncio
 import io
-import base64
+import pybase64
+import hashlib
+import httpx
 import json
+import logging
+import logging.handlers
+import orjson
 import os
+import queue
+import string
 import sys
+import tempfile
+import threading
 from pathlib import Path
-from anthropic import AsyncAnthropic
+from contextlib import asynccontextmanager
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from cachetools import TTLCache
 from dotenv import load_dotenv
+from typing_extensions import TypedDict
 
 # Fix Windows console encoding for emojis
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Logging goes through a queue so the event loop never blocks on stdout writes
+log_queue: queue.Queue = queue.Queue(-1)
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+logger = logging.getLogger("python_api")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+logger.propagate = False
+log_listener.start()
+
 # Load environment variables from root directory
 root_env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=root_env_path)
 
-app = FastAPI(title="Cognivo Python API", version="1.0.0")
+# Shared HTTP session for calls back to the Express API (keep-alive pooled)
+http_session: Optional[aiohttp.ClientSession] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_session
+    http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60))
+    yield
+    await http_session.close()
+    if anthropic_client:
+        await anthropic_client.close()
+    log_listener.stop()
+
+app = FastAPI(title="Cognivo Python API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS middleware to allow requests from your React app
 app.add_middleware(
@@ -32,45 +69,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Gzip large JSON responses (file processing results), but never the chat stream -
+# compressing it would buffer tokens inside the compressor instead of sending them
+STREAMING_PATHS = {"/api/chat/stream"}
+
+class NonStreamingGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(NonStreamingGZipMiddleware, minimum_size=1024)
+
 # Initialize Anthropic client
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 if not ANTHROPIC_API_KEY:
-    print("[Python API] Warning: ANTHROPIC_API_KEY not set")
+    logger.warning("[Python API] Warning: ANTHROPIC_API_KEY not set")
 
-anthropic_client = AsyncAnthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
+# One pooled HTTP/2 connection multiplexes concurrent chat streams (SDK default timeouts kept)
+anthropic_client = AsyncAnthropic(
+    api_key=ANTHROPIC_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+    ),
+) if ANTHROPIC_API_KEY else None
+
+# Uploads larger than this spill from memory to a temp file on disk
+UPLOAD_SPOOL_MAX_BYTES = 16 * 1024 * 1024
 
 # System prompt configuration
 INCLUDE_RAW_FILE_DATA = os.getenv("INCLUDE_RAW_FILE_DATA", "false").lower() in ("true", "1", "yes")
 
+# Chat response cache - replays identical requests within Anthropic's 5 minute prompt cache lifetime
+CHAT_RESPONSE_CACHE_TTL_SECONDS = 300
+chat_response_cache = TTLCache(maxsize=256, ttl=CHAT_RESPONSE_CACHE_TTL_SECONDS)
+
+# File processing cache - schema + subsets keyed by (SHA-256 of the uploaded bytes, file name);
+# the name is part of the key because summaries and prompts mention it
+FILE_RESULT_CACHE_TTL_SECONDS = 3600
+file_result_cache = TTLCache(maxsize=64, ttl=FILE_RESULT_CACHE_TTL_SECONDS)
+
+# Raw file rendering cache - parsed + serialized rawFileData keyed by BLAKE2 of the base64 buffer
+RAW_FILE_RENDER_CACHE_TTL_SECONDS = 3600
+raw_file_render_cache = TTLCache(maxsize=64, ttl=RAW_FILE_RENDER_CACHE_TTL_SECONDS)
+raw_file_render_lock = threading.Lock()  # Prompts are built in worker threads
+
+# Raw data larger than this is sent as a head/tail sample instead of every row
+RAW_DATA_MAX_FULL_ROWS = int(os.getenv("RAW_DATA_MAX_FULL_ROWS", "2000"))
+RAW_DATA_HEAD_ROWS = 20
+RAW_DATA_TAIL_ROWS = 5
+
+# Subsets with more data points than this are sent as a head/tail excerpt
+SUBSET_PROMPT_MAX_POINTS = 500
+SUBSET_PROMPT_TAIL_POINTS = 50
+
 # ============================================
 # Claude Pricing Configuration
 # ============================================
 # Claude Sonnet 4 pricing (as of 2025)
 CLAUDE_INPUT_PRICE_PER_MTOK = 1.0   # $1 per 1M input tokens
 CLAUDE_OUTPUT_PRICE_PER_MTOK = 5.0  # $5 per 1M output tokens
+CLAUDE_CACHE_WRITE_MULTIPLIER = 1.25  # Prompt cache writes cost 1.25x base input
+CLAUDE_CACHE_READ_MULTIPLIER = 0.1    # Prompt cache reads cost 0.1x base input
 
-def calculate_claude_cost(input_tokens: int, output_tokens: int) -> float:
+def calculate_claude_cost(input_tokens: int, output_tokens: int, cache_creation_tokens: int = 0, cache_read_tokens: int = 0) -> float:
     """Calculate cost in USD for Claude API usage"""
     input_cost = (input_tokens / 1_000_000) * CLAUDE_INPUT_PRICE_PER_MTOK
     output_cost = (output_tokens / 1_000_000) * CLAUDE_OUTPUT_PRICE_PER_MTOK
-    return input_cost + output_cost
+    cache_write_cost = (cache_creation_tokens / 1_000_000) * CLAUDE_INPUT_PRICE_PER_MTOK * CLAUDE_CACHE_WRITE_MULTIPLIER
+    cache_read_cost = (cache_read_tokens / 1_000_000) * CLAUDE_INPUT_PRICE_PER_MTOK * CLAUDE_CACHE_READ_MULTIPLIER
+    return input_cost + output_cost + cache_write_cost + cache_read_cost
 
-async def track_token_usage(username: str, input_tokens: int, output_tokens: int):
+async def track_token_usage(username: str, input_tokens: int, output_tokens: int, cache_creation_tokens: int = 0, cache_read_tokens: int = 0):
     """Track token usage to MongoDB via Express API"""
     try:
-        import aiohttp
-        total_tokens = input_tokens + output_tokens
-        cost = calculate_claude_cost(input_tokens, output_tokens)
+        total_tokens = input_tokens + output_tokens + cache_creation_tokens + cache_read_tokens
+        cost = calculate_claude_cost(input_tokens, output_tokens, cache_creation_tokens, cache_read_tokens)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"http://localhost:3001/api/user/track-tokens",
-                json={"username": username, "tokens": total_tokens, "cost": cost}
-            ) as response:
-                pass  # Silent tracking
+        async with http_session.post(
+            f"http://localhost:3001/api/user/track-tokens",
+            json={"username": username, "tokens": total_tokens, "cost": cost}
+        ) as response:
+            pass  # Silent tracking
     except Exception:
         pass  # Silent fail - don't break on tracking errors
 
+# Strong references to in-flight tracking tasks so they aren't garbage collected
+background_tasks = set()
+
+def schedule_token_tracking(username: str, input_tokens: int, output_tokens: int, cache_creation_tokens: int = 0, cache_read_tokens: int = 0):
+    """Fire-and-forget token tracking so responses don't wait on the Express round-trip"""
+    task = asyncio.create_task(track_token_usage(username, input_tokens, output_tokens, cache_creation_tokens, cache_read_tokens))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
 # ============================================
 # Data Models
 # ============================================
@@ -88,19 +182,17 @@ class FileSchema(BaseModel):
     rowCount: int
     summary: str
 
-class FileProcessingRequest(BaseModel):
-    fileBuffer: str  # Base64 encoded file content
-    fileName: str
-    fileType: str
-    username: str  # Username for token tracking
-
 class FileProcessingResponse(BaseModel):
     success: bool
     file_schema: Optional[FileSchema] = None  # Renamed from 'schema' to avoid shadowing BaseModel.schema
     subsets: Optional[List[DataSubset]] = None
     error: Optional[str] = None
 
-class ChatMessage(BaseModel):
+# Validates Claude's whole subsets list in one pydantic-core call
+DATA_SUBSETS_ADAPTER = TypeAdapter(List[DataSubset])
+
+class ChatMessage(TypedDict):
+    # TypedDict validates straight to plain dicts that can be handed to Anthropic as-is
     role: str  # 'user' or 'assistant'
     content: str
 
@@ -109,6 +201,7 @@ class CanvasUpdateRequest(BaseModel):
     current_canvas: str  # JSON string of current canvas
     data_sources: List[Dict[str, Any]]  # All user's data files
     username: str  # Username for token tracking
+    regenerate: bool = False  # Explicit "try again" - skip the response cache and sample a new answer
 
 # ============================================
 # Routes
@@ -127,82 +220,37 @@ async def health_check():
 # CLAUDE AI FILE ANALYSIS
 # ============================================
 
-async def generate_subsets_with_claude(df, file_name: str, file_type: str, username: str) -> FileProcessingResponse:
-    """
-    Use Claude AI to analyze dataframe and generate intelligent visualization subsets
-    """
-    import pandas as pd
-    import numpy as np
-    
-    if not anthropic_client:
-        raise ValueError("Anthropic API key not configured")
-    
-    try:
-        # Analyze dataframe structure
-        row_count = len(df)
-        col_count = len(df.columns)
-        
-        # Get column information
-        column_info = []
-        for col in df.columns:
-            dtype = str(df[col].dtype)
-            null_count = df[col].isnull().sum()
-            unique_count = df[col].nunique()
-            
-            # Simplify dtype names
-            if 'int' in dtype or 'float' in dtype:
-                simple_type = 'number'
-            elif 'datetime' in dtype:
-                simple_type = 'date'
-            elif 'bool' in dtype:
-                simple_type = 'boolean'
-            else:
-                simple_type = 'string'
-            
-            # Get sample values, convert datetime to string
-            sample_values = df[col].dropna().head(3).tolist() if len(df[col].dropna()) > 0 else []
-            if 'datetime' in dtype:
-                sample_values = [str(v) for v in sample_values]
-            
-            column_info.append({
-                "name": str(col),
-                "type": simple_type,
-                "dtype": dtype,
-                "null_count": int(null_count),
-                "unique_count": int(unique_count),
-                "sample_values": sample_values
-            })
-        
-        # Prepare data for Claude - sample if too large
-        MAX_ROWS = 5000
-        
-        # Convert datetime columns to strings for JSON serialization
-        df_for_json = df.copy()
-        for col in df_for_json.select_dtypes(include=['datetime64']).columns:
-            df_for_json[col] = df_for_json[col].astype(str)
-        
-        if row_count > MAX_ROWS:
-            sample_df = df_for_json.sample(n=min(1000, row_count), random_state=42)
-            data_preview = sample_df.head(50).to_dict(orient='records')
-            data_stats = df_for_json.describe(include='all').to_dict()
-        else:
-            data_preview = df_for_json.head(50).to_dict(orient='records')
-            data_stats = df_for_json.describe(include='all').to_dict()
-        
-        # Build system prompt
-        system_prompt = f"""You are an expert data visualization analyst. Your task is to analyze a dataset and create 5-15 diverse, meaningful visualization subsets.
+# Unique counts above this are reported as ">UNIQUE_COUNT_CAP"
+UNIQUE_COUNT_CAP = 10_000
 
-DATASET INFORMATION:
-- File: {file_name}
-- Type: {file_type}
-- Dimensions: {row_count} rows × {col_count} columns
-- Columns: {json.dumps(column_info, indent=2)}
+# Rows scanned for non-null sample values per column
+SAMPLE_VALUE_SCAN_ROWS = 100
 
-DATA PREVIEW (first 50 rows):
-{json.dumps(data_preview, indent=2, default=str)}
+# Bounds for the category overview sent to Claude
+MAX_TOP_CATEGORY_COLUMNS = 10
+MAX_TOP_CATEGORY_VALUES = 5
 
-STATISTICAL SUMMARY:
-{json.dumps(data_stats, indent=2, default=str)}
+# Statistical summary covers at most this many numeric columns
+MAX_STATS_COLUMNS = 50
+
+# Output budget for file analysis - scales with the number of subsets requested
+SUBSET_MIN_COUNT = 5
+SUBSET_MAX_COUNT = 15
+SUBSET_TOKENS_BASE = 1000
+SUBSET_TOKENS_PER_SUBSET = 1000
+# Keeps each subset inside SUBSET_TOKENS_PER_SUBSET (~15 tokens per point plus axis text)
+SUBSET_MAX_DATA_POINTS = 40
+# One retry at this budget if a response is still cut off
+SUBSET_TOKENS_RETRY_CEILING = 32000
+
+def dumps_for_prompt(value: Any) -> str:
+    """
+    Compact JSON for prompt context - numpy scalars and non-string keys pass straight through
+    """
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+# Static instructions for file analysis - identical for every upload so Anthropic can cache them
+SUBSET_SYSTEM_PROMPT = """You are an expert data visualization analyst. Your task is to analyze the dataset described below and create 5-15 diverse, meaningful visualization subsets.
 
 YOUR TASK:
 Analyze this data and create 5-15 visualization subsets that reveal different insights. Each subset should be optimized for a specific chart type.
@@ -222,31 +270,31 @@ REQUIREMENTS:
 IMPORTANT CHART TYPE GUIDANCE:
 - Line charts: Time series, trends (xKey=date/time, yKey=metric)
 - Bar charts: Category comparisons (xKey=category, yKey=value)
-- Pie charts: Part-to-whole distributions - MUST use nameKey for category labels, yKey for values. Data MUST be array of objects with name/value pairs like: [{{"name": "Cat A", "value": 30}}, {{"name": "Cat B", "value": 45}}]
+- Pie charts: Part-to-whole distributions - MUST use nameKey for category labels, yKey for values. Data MUST be array of objects with name/value pairs like: [{"name": "Cat A", "value": 30}, {"name": "Cat B", "value": 45}]
 - Area charts: Cumulative trends over time (xKey=date, yKey=cumulative)
 - Scatter: Correlations between two metrics (xKey=metric1, yKey=metric2)
 - Composed: Multiple metrics on same timeline (xKey=date, yKey=primary, secondaryKey=secondary)
 
 OUTPUT FORMAT (strict JSON):
-{{
-  "file_schema": {{
+{
+  "file_schema": {
     "columns": [
-      {{"name": "column_name", "type": "number|string|date|boolean", "description": "what this column represents"}}
+      {"name": "column_name", "type": "number|string|date|boolean", "description": "what this column represents"}
     ],
-    "rowCount": {row_count},
+    "rowCount": <row count from DATASET INFORMATION>,
     "summary": "2-3 sentence overview of what this dataset contains"
-  }},
+  },
   "subsets": [
-    {{
+    {
       "description": "Clear description of what insight this visualization shows",
       "xAxisName": "Short label for X-axis",
       "xAxisDescription": "Detailed description of what X-axis represents",
       "yAxisName": "Short label for Y-axis",
       "yAxisDescription": "Detailed description of what Y-axis represents",
-      "dataPoints": [{{"x": "value", "y": number}}]
-    }}
+      "dataPoints": [{"x": "value", "y": number}]
+    }
   ]
-}}
+}
 
 CRITICAL:
 - Ensure dataPoints array contains actual data from the dataset
@@ -254,34 +302,298 @@ CRITICAL:
 - All numbers must be valid (no NaN or Infinity)
 - X-axis values should be strings or numbers (not complex objects)
 - Y-axis values must be numbers
+""" + f"""- At most {SUBSET_MAX_DATA_POINTS} dataPoints per subset - aggregate or bucket longer series (e.g. monthly, top categories)
 - Return ONLY valid JSON, no markdown or explanations"""
 
-        user_message = f"Please analyze this {file_type} file and generate intelligent visualization subsets as specified."
+# Schemas at or below these limits (with exactly one date column) use template subsets
+TEMPLATE_MAX_NUMBER_COLUMNS = 3
+TEMPLATE_MAX_STRING_COLUMNS = 2
+TEMPLATE_MAX_CATEGORIES = 15
+# Category columns must repeat - at most this share of rows may hold distinct values
+TEMPLATE_MAX_CATEGORY_SHARE = 0.5
+# Time bucket by date span: (longest span in days, pandas period, axis label, adjective)
+TEMPLATE_TIME_PERIODS = [(31, "D", "Day", "Daily"), (183, "W", "Week", "Weekly")]
+TEMPLATE_DEFAULT_PERIOD = ("M", "Month", "Monthly")
+# Decimal places kept on template y values (float sums like 0.1 + 0.2 otherwise serialize ~17 digits)
+DATA_POINT_DECIMALS = 4
+
+def series_to_data_points(series) -> List[Dict[str, Any]]:
+    """Convert an aggregated Series to x/y data points, dropping non-finite values"""
+    import numpy as np
+    series = series.round(DATA_POINT_DECIMALS)
+    return [{"x": str(x), "y": float(y)} for x, y in series.items() if np.isfinite(y)]
+
+def template_time_buckets(dates) -> Tuple[Any, str, str]:
+    """Bucket dates by day, week or month depending on their span -> (buckets, label, adjective)"""
+    span_days = (dates.max() - dates.min()).days if dates.notna().any() else 0
+    freq, label, adjective = next(
+        ((freq, label, adjective) for max_days, freq, label, adjective in TEMPLATE_TIME_PERIODS if span_days <= max_days),
+        TEMPLATE_DEFAULT_PERIOD,
+    )
+    periods = dates.dt.to_period(freq)
+    # Weeks are labelled by their start date rather than pandas' "start/end" range
+    buckets = periods.dt.start_time.dt.strftime("%Y-%m-%d") if freq == "W" else periods
+    return buckets, label, adjective
+
+def is_identifier_column(info: Dict[str, Any], row_count: int) -> bool:
+    """Number columns named like an ID, or integer columns unique on every row, aren't measures"""
+    name = info["name"].lower()
+    if name == "id" or name.endswith(("_id", " id", "-id")):
+        return True
+    unique_per_row = isinstance(info["unique_count"], str) or info["unique_count"] == row_count
+    return unique_per_row and row_count > TEMPLATE_MAX_CATEGORIES and info["dtype"].lower().startswith(("int", "uint"))
+
+def is_category_column(info: Dict[str, Any], row_count: int) -> bool:
+    """Text columns with a few repeated values - not IDs, names or free text"""
+    unique_count = info["unique_count"]
+    return (isinstance(unique_count, int) and 2 <= unique_count <= TEMPLATE_MAX_CATEGORIES
+            and unique_count <= row_count * TEMPLATE_MAX_CATEGORY_SHARE)
+
+def generate_subsets_from_template(df, column_info: List[Dict[str, Any]], file_name: str, file_type: str, dataset_note: Optional[str] = None) -> Optional[FileProcessingResponse]:
+    """
+    Build subsets with pandas aggregations for simple time-series tables
+    (one date column, a few numeric measures, at most two text categories).
+    Returns None when the schema isn't simple enough, so Claude handles it.
+    """
+    row_count = len(df)
+    columns_by_type = {"number": [], "date": [], "string": [], "boolean": []}
+    category_cols = []
+    for col, info in zip(df.columns, column_info):
+        if info["type"] == "number" and is_identifier_column(info, row_count):
+            continue
+        columns_by_type[info["type"]].append(col)
+        if info["type"] == "string" and is_category_column(info, row_count):
+            category_cols.append(col)
+    
+    number_cols = columns_by_type["number"]
+    string_cols = columns_by_type["string"]
+    if (len(columns_by_type["date"]) != 1 or not number_cols
+            or len(number_cols) > TEMPLATE_MAX_NUMBER_COLUMNS
+            or len(string_cols) > TEMPLATE_MAX_STRING_COLUMNS):
+        return None
+    
+    date_col = columns_by_type["date"][0]
+    buckets, period_label, period_adjective = template_time_buckets(df[date_col])
+    period_name = period_label.lower()
+    subsets = []
+    
+    # Trend of each measure over time - skipped when everything falls in one bucket
+    if buckets.nunique() >= 2:
+        for num_col in number_cols:
+            subsets.append(DataSubset(
+                description=f"{period_adjective} total of {num_col} over time",
+                xAxisName=period_label,
+                xAxisDescription=f"Calendar {period_name} of {date_col}",
+                yAxisName=str(num_col),
+                yAxisDescription=f"Sum of {num_col} per {period_name}",
+                dataPoints=series_to_data_points(df[num_col].groupby(buckets).sum()),
+            ))
+        
+        subsets.append(DataSubset(
+            description=f"Number of records per {period_name}",
+            xAxisName=period_label,
+            xAxisDescription=f"Calendar {period_name} of {date_col}",
+            yAxisName="Records",
+            yAxisDescription=f"Count of rows per {period_name}",
+            dataPoints=series_to_data_points(df.groupby(buckets).size()),
+        ))
+    
+    # Category breakdowns of the primary measure (ID-like and free-text columns skipped)
+    primary_col = number_cols[0]
+    for cat_col in category_cols:
+        totals = df.groupby(cat_col)[primary_col].sum().sort_values(ascending=False)
+        subsets.append(DataSubset(
+            description=f"Total {primary_col} by {cat_col}",
+            xAxisName=str(cat_col),
+            xAxisDescription=f"Each value of {cat_col}",
+            yAxisName=str(primary_col),
+            yAxisDescription=f"Sum of {primary_col} per {cat_col}",
+            dataPoints=series_to_data_points(totals),
+        ))
+    
+    subsets = [subset for subset in subsets if subset.dataPoints]
+    if not subsets:
+        return None
+    
+    summary = f"{file_type} file {file_name} with {len(df)} rows of {', '.join(map(str, number_cols))} recorded by {date_col}."
+    if dataset_note:
+        summary += f" Note: {dataset_note}."
+    
+    return FileProcessingResponse(
+        success=True,
+        file_schema=FileSchema(
+            columns=[
+                {"name": info["name"], "type": info["type"], "description": f"{info['type'].capitalize()} column {info['name']}"}
+                for info in column_info
+            ],
+            rowCount=len(df),
+            summary=summary,
+        ),
+        subsets=subsets,
+    )
 
-        # Call Claude API with streaming (required for large requests)
-        response_text = ""
-        input_tokens = 0
-        output_tokens = 0
+def describe_columns(df) -> List[Dict[str, Any]]:
+    """
+    Per-column type, null/unique counts and sample values for the subset prompt
+    """
+    import pandas as pd
+    import numpy as np
+    
+    # Analyze dataframe structure
+    row_count = len(df)
+    
+    # Get column information - null/unique counts in one frame-wide pass each
+    null_counts = df.isnull().sum()
+    
+    # Columns whose first UNIQUE_COUNT_CAP rows are all distinct are reported as
+    # high-cardinality instead of hashing every row
+    if row_count > UNIQUE_COUNT_CAP:
+        prefix_uniques = df.head(UNIQUE_COUNT_CAP).nunique().to_numpy()
+        high_cardinality = prefix_uniques >= UNIQUE_COUNT_CAP
+        exact_uniques = iter(df.iloc[:, np.flatnonzero(~high_cardinality)].nunique())
+        unique_counts = [f">{UNIQUE_COUNT_CAP}" if is_high else int(next(exact_uniques)) for is_high in high_cardinality]
+    else:
+        unique_counts = [int(n) for n in df.nunique()]
+    
+    column_info = []
+    for col, col_dtype, null_count, unique_count in zip(df.columns, df.dtypes, null_counts, unique_counts):
+        dtype = str(col_dtype)
         
-        async with anthropic_client.messages.stream(
-            model="claude-haiku-4-5",
-            max_tokens=32000,  # Large enough for comprehensive file analysis with multiple subsets
-            temperature=0.3,
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": user_message}
-            ]
-        ) as stream:
-            async for text in stream.text_stream:
-                response_text += text
-            
-            # Get final message for token usage
-            final_message = await stream.get_final_message()
-            input_tokens = final_message.usage.input_tokens
-            output_tokens = final_message.usage.output_tokens
+        # Simplify dtype names (bool first - pandas treats bool as numeric)
+        if pd.api.types.is_bool_dtype(col_dtype):
+            simple_type = 'boolean'
+        elif pd.api.types.is_numeric_dtype(col_dtype):
+            simple_type = 'number'
+        elif pd.api.types.is_datetime64_any_dtype(col_dtype):
+            simple_type = 'date'
+        else:
+            simple_type = 'string'
         
-        # Track token usage
-        await track_token_usage(username, input_tokens, output_tokens)
+        # Get sample values from a short prefix (dropna on the full column copies it), convert datetime to string
+        sample_values = df[col].head(SAMPLE_VALUE_SCAN_ROWS).dropna().head(3).tolist()
+        if simple_type == 'date':
+            sample_values = [str(v) for v in sample_values]
+        
+        column_info.append({
+            "name": str(col),
+            "type": simple_type,
+            "dtype": dtype,
+            "null_count": int(null_count),
+            "unique_count": unique_count,
+            "sample_values": sample_values
+        })
+    
+    return column_info
+
+def build_dataset_context(df, column_info: List[Dict[str, Any]], file_name: str, file_type: str, dataset_note: Optional[str] = None) -> Tuple[str, int]:
+    """
+    Render the per-file DATASET INFORMATION prompt block and the matching output token budget
+    """
+    row_count = len(df)
+    col_count = len(df.columns)
+    
+    # Prepare data for Claude - sample if too large
+    MAX_ROWS = 5000
+    SAMPLE_ROWS = 1000
+    
+    # Large files: preview and stats both come from one 1000-row sample
+    stats_source = df.sample(n=SAMPLE_ROWS, random_state=42) if row_count > MAX_ROWS else df
+    stats_note = f" - computed on a random {SAMPLE_ROWS}-row sample" if row_count > MAX_ROWS else ""
+    
+    # Columnar (one list per column) - no repeated column names per row in the prompt.
+    # Timestamps are left as-is: dumps_for_prompt's default=str renders them like astype(str)
+    data_preview = {str(col): values for col, values in stats_source.head(50).to_dict(orient='list').items()}
+    
+    # Numeric stats only - describe(include='all') runs value counts on every string column
+    numeric_df = stats_source.select_dtypes(include='number').iloc[:, :MAX_STATS_COLUMNS]
+    data_stats = numeric_df.describe().round(4).to_dict() if not numeric_df.empty else {}
+    
+    # Compact category overview: top 5 values for at most 10 string columns
+    top_categories = {
+        str(col): {str(value): int(count) for value, count in stats_source[col].value_counts().head(MAX_TOP_CATEGORY_VALUES).items()}
+        for col in stats_source.select_dtypes(include='object').columns[:MAX_TOP_CATEGORY_COLUMNS]
+    }
+    
+    # Size the output budget to the dataset: wider files get more subsets
+    max_subsets = min(SUBSET_MAX_COUNT, max(SUBSET_MIN_COUNT, col_count))
+    max_tokens = SUBSET_TOKENS_BASE + SUBSET_TOKENS_PER_SUBSET * max_subsets
+    
+    note_line = f"- Note: {dataset_note}\n" if dataset_note else ""
+    
+    dataset_context = f"""DATASET INFORMATION:
+- File: {file_name}
+- Type: {file_type}
+- Dimensions: {row_count} rows × {col_count} columns
+- Subsets to create: at most {max_subsets}
+{note_line}- Columns: {dumps_for_prompt(column_info)}
+
+DATA PREVIEW (first 50 rows, columnar - each column maps to its list of row values):
+{dumps_for_prompt(data_preview)}
+
+STATISTICAL SUMMARY (numeric columns{stats_note}):
+{dumps_for_prompt(data_stats)}
+
+TOP CATEGORIES (most frequent values per text column{stats_note}):
+{dumps_for_prompt(top_categories)}"""
+    
+    return dataset_context, max_tokens
+
+async def generate_subsets_with_claude(df, file_name: str, file_type: str, username: str, dataset_note: Optional[str] = None) -> FileProcessingResponse:
+    """
+    Use Claude AI to analyze dataframe and generate intelligent visualization subsets
+    """
+    try:
+        # pandas analysis runs in worker threads so uploads don't stall other requests
+        column_info = await asyncio.to_thread(describe_columns, df)
+        
+        # Simple time-series tables don't need Claude - build the subsets directly
+        template_result = await asyncio.to_thread(generate_subsets_from_template, df, column_info, file_name, file_type, dataset_note)
+        if template_result is not None:
+            return template_result
+        
+        if not anthropic_client:
+            raise ValueError("Anthropic API key not configured")
+        
+        dataset_context, max_tokens = await asyncio.to_thread(build_dataset_context, df, column_info, file_name, file_type, dataset_note)
+        
+        # Build system prompt: cached static instructions + per-file dataset context
+        system_prompt = [
+            {"type": "text", "text": SUBSET_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": dataset_context},
+        ]
+
+        user_message = f"Please analyze this {file_type} file and generate intelligent visualization subsets as specified."
+
+        # Call Claude API with streaming (required for large requests) - retried once
+        # with the full ceiling if the sized budget cuts the response off
+        for attempt_max_tokens in (max_tokens, SUBSET_TOKENS_RETRY_CEILING):
+            async with anthropic_client.messages.stream(
+                model="claude-haiku-4-5",
+                max_tokens=attempt_max_tokens,
+                temperature=0.3,
+                system=system_prompt,
+                messages=[
+                    {"role": "user", "content": user_message}
+                ]
+            ) as stream:
+                # The SDK already accumulates the streamed text - read it once from the final message
+                # instead of concatenating our own copy chunk by chunk
+                final_message = await stream.get_final_message()
+                response_text = "".join(block.text for block in final_message.content if block.type == "text")
+                
+                # Token usage
+                input_tokens = final_message.usage.input_tokens
+                output_tokens = final_message.usage.output_tokens
+                cache_creation_tokens = final_message.usage.cache_creation_input_tokens or 0
+                cache_read_tokens = final_message.usage.cache_read_input_tokens or 0
+            
+            # Track token usage
+            schedule_token_tracking(username, input_tokens, output_tokens, cache_creation_tokens, cache_read_tokens)
+            
+            if final_message.stop_reason != "max_tokens":
+                break
+        else:
+            raise ValueError("Claude response was cut off before the analysis finished")
         
         # Parse JSON (handle markdown code blocks if present)
         response_text = response_text.strip()
@@ -294,7 +606,7 @@ CRITICAL:
         response_text = response_text.strip()
         
         # Parse the JSON
-        result = json.loads(response_text)
+        result = orjson.loads(response_text)
         
         # Validate structure
         if "file_schema" not in result or "subsets" not in result:
@@ -304,8 +616,8 @@ CRITICAL:
             raise ValueError("No subsets generated by Claude")
         
         # Convert to Pydantic models
-        schema = FileSchema(**result["file_schema"])
-        subsets = [DataSubset(**subset) for subset in result["subsets"]]
+        schema = FileSchema.model_validate(result["file_schema"])
+        subsets = DATA_SUBSETS_ADAPTER.validate_python(result["subsets"])
         
         return FileProcessingResponse(
             success=True,
@@ -324,40 +636,115 @@ CRITICAL:
 # ============================================
 
 @app.post("/api/process-file", response_model=FileProcessingResponse)
-async def process_file(request: FileProcessingRequest):
+async def process_file(request: Request, fileName: str, fileType: str, username: str):
     """
     Process uploaded file: parse, create schema, generate subsets
     This is called by the Express server after file upload
+    
+    The raw file bytes are streamed in the request body (application/octet-stream);
+    fileName, fileType and username are passed as query params.
     """
     try:
-        # Decode the base64 file buffer
-        file_bytes = base64.b64decode(request.fileBuffer)
-        
-        # Determine file type and process accordingly
-        if request.fileType.lower().endswith('.csv') or 'csv' in request.fileType.lower():
-            result = await process_csv_file(file_bytes, request.fileName, request.username)
-        elif request.fileType.lower().endswith(('.xlsx', '.xls')) or 'spreadsheet' in request.fileType.lower() or 'excel' in request.fileType.lower():
-            result = await process_excel_file(file_bytes, request.fileName, request.username)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {request.fileType}")
+        # Stream the body into a spooled temp file instead of buffering base64 JSON
+        with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES) as file_obj:
+            # Hash while streaming so identical re-uploads can skip Claude entirely
+            content_hash = hashlib.sha256()
+            async for chunk in request.stream():
+                content_hash.update(chunk)
+                file_obj.write(chunk)
+            file_obj.seek(0)
+            
+            cache_key = (content_hash.hexdigest(), fileName)
+            cached_result = file_result_cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+            
+            # Determine file type and process accordingly
+            if fileType.lower().endswith('.csv') or 'csv' in fileType.lower():
+                result = await process_csv_file(file_obj, fileName, username)
+            elif fileType.lower().endswith(('.xlsx', '.xls')) or 'spreadsheet' in fileType.lower() or 'excel' in fileType.lower():
+                result = await process_excel_file(file_obj, fileName, username)
+            else:
+                raise HTTPException(status_code=400, detail=f"Unsupported file type: {fileType}")
         
+        if result.success:
+            file_result_cache[cache_key] = result
         return result
         
     except Exception as e:
+        logger.exception("[Python API] File processing failed for %s", fileName)
         return FileProcessingResponse(
             success=False,
             error=str(e)
         )
 
-async def process_csv_file(file_bytes: bytes, file_name: str, username: str) -> FileProcessingResponse:
+def read_csv_dataframe(file_obj: IO[bytes]):
+    """
+    Read a CSV with Arrow's multithreaded parser, falling back to pandas for CSVs Arrow rejects
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    
+    try:
+        table = pacsv.read_csv(file_obj, read_options=pacsv.ReadOptions(use_threads=True))
+        # Date-only columns (date32) would otherwise become object columns of datetime.date
+        df = table.to_pandas(self_destruct=True, date_as_object=False)
+        del table
+        return df
+    except pa.ArrowInvalid:
+        file_obj.seek(0)
+        return pd.read_csv(file_obj)
+
+def read_csv_records(file_obj: IO[bytes]) -> Tuple[List[str], int, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Read a CSV via Arrow to (column names, row count, head rows, tail rows) for the prompt
+    
+    Files with at most RAW_DATA_MAX_FULL_ROWS rows return every row as the head and
+    no tail; larger files only convert the sampled rows to dicts.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    
+    try:
+        table = pacsv.read_csv(file_obj, read_options=pacsv.ReadOptions(use_threads=True))
+        row_count = table.num_rows
+        if row_count <= RAW_DATA_MAX_FULL_ROWS:
+            return table.column_names, row_count, table.to_pylist(), []
+        head = table.slice(0, RAW_DATA_HEAD_ROWS).to_pylist()
+        tail = table.slice(row_count - RAW_DATA_TAIL_ROWS).to_pylist()
+        return table.column_names, row_count, head, tail
+    except pa.ArrowInvalid:
+        file_obj.seek(0)
+        df = pd.read_csv(file_obj)
+        columns = [str(column) for column in df.columns]
+        if len(df) <= RAW_DATA_MAX_FULL_ROWS:
+            return columns, len(df), df.to_dict(orient='records'), []
+        head = df.head(RAW_DATA_HEAD_ROWS).to_dict(orient='records')
+        tail = df.tail(RAW_DATA_TAIL_ROWS).to_dict(orient='records')
+        return columns, len(df), head, tail
+
+def read_excel_sheets(file_obj: IO[bytes]) -> Dict[str, Any]:
+    """
+    Read every sheet of a workbook with the Rust calamine engine, falling back to openpyxl
+    """
+    import pandas as pd
+    
+    try:
+        return pd.read_excel(file_obj, sheet_name=None, engine='calamine')
+    except ImportError:
+        # python-calamine not installed
+        file_obj.seek(0)
+        return pd.read_excel(file_obj, sheet_name=None)
+
+async def process_csv_file(file_obj: IO[bytes], file_name: str, username: str) -> FileProcessingResponse:
     """
     Process CSV file using Claude AI to generate intelligent subsets
     """
     try:
-        import pandas as pd
-        
-        # Read CSV file
-        df = pd.read_csv(io.BytesIO(file_bytes))
+        # Read CSV file in a worker thread so parsing doesn't block the event loop
+        df = await asyncio.to_thread(read_csv_dataframe, file_obj)
         
         if df.empty:
             raise ValueError("CSV file is empty")
@@ -368,37 +755,46 @@ async def process_csv_file(file_bytes: bytes, file_name: str, username: str) ->
     except Exception as e:
         raise
 
-async def process_excel_file(file_bytes: bytes, file_name: str, username: str) -> FileProcessingResponse:
+async def process_excel_file(file_obj: IO[bytes], file_name: str, username: str) -> FileProcessingResponse:
     """
     Process Excel file using Claude AI to generate intelligent subsets
     """
     try:
         import pandas as pd
+        import numpy as np
         
-        # Read Excel file (read all sheets)
-        sheets_dict = pd.read_excel(io.BytesIO(file_bytes), sheet_name=None)
+        # Read Excel file (read all sheets) in a worker thread so parsing doesn't block the event loop
+        sheets_dict = await asyncio.to_thread(read_excel_sheets, file_obj)
         
         if not sheets_dict:
             raise ValueError("Excel file contains no sheets")
         
         # Combine all sheets into one dataframe
+        dataset_note = None
         if len(sheets_dict) == 1:
             df = list(sheets_dict.values())[0]
-        else:
-            # Concatenate all sheets vertically
-            all_dfs = []
-            for sheet_name, sheet_df in sheets_dict.items():
-                # Add a column to track which sheet the data came from
-                sheet_df['_source_sheet'] = sheet_name
-                all_dfs.append(sheet_df)
+        elif len({frozenset(sheet_df.columns) for sheet_df in sheets_dict.values()}) == 1:
+            # Same columns on every sheet - concatenate vertically
+            df = pd.concat(sheets_dict.values(), ignore_index=True)
             
-            df = pd.concat(all_dfs, ignore_index=True)
+            # Track which sheet the data came from as one categorical column added after the
+            # concat (no per-sheet column inserts, no per-row strings)
+            sheet_lengths = [len(sheet_df) for sheet_df in sheets_dict.values()]
+            df['_source_sheet'] = pd.Categorical.from_codes(
+                np.repeat(np.arange(len(sheets_dict), dtype=np.int32), sheet_lengths), categories=list(sheets_dict)
+            )
+        else:
+            # Different layouts would concat into a mostly-NaN frame - analyze the largest sheet
+            largest_sheet = max(sheets_dict, key=lambda name: len(sheets_dict[name]))
+            df = sheets_dict[largest_sheet]
+            other_sheets = [name for name in sheets_dict if name != largest_sheet]
+            dataset_note = f"Workbook sheets have different columns; analyzing sheet '{largest_sheet}' only (also contains: {', '.join(map(str, other_sheets))})"
         
         if df.empty:
             raise ValueError("Excel sheet is empty")
         
         # Generate subsets using Claude AI
-        return await generate_subsets_with_claude(df, file_name, "Excel", username)
+        return await generate_subsets_with_claude(df, file_name, "Excel", username, dataset_note)
         
     except Exception as e:
         raise
@@ -410,11 +806,53 @@ async def process_excel_file(file_bytes: bytes, file_name: str, username: str) -
 class ChatTitleRequest(BaseModel):
     user_message: str
 
+# Titles are cached by the start of the first message
+CHAT_TITLE_CACHE_TTL_SECONDS = 3600
+CHAT_TITLE_CACHE_KEY_CHARS = 200
+chat_title_cache = TTLCache(maxsize=512, ttl=CHAT_TITLE_CACHE_TTL_SECONDS)
+
+# Short messages naming one of these topics are titled locally, without a Claude call
+QUICK_TITLE_MAX_WORDS = 5
+QUICK_TITLE_EMOJIS = {
+    "sales": "📊", "revenue": "📊", "dashboard": "📊", "analytics": "📊",
+    "budget": "💰", "expenses": "💰", "costs": "💰", "finance": "💰",
+    "growth": "📈", "trends": "📈", "performance": "📈", "metrics": "📈",
+    "customers": "👥", "employees": "👥", "team": "👥",
+    "products": "📦", "inventory": "📦", "orders": "📦",
+    "report": "📝", "summary": "📝",
+}
+
+def quick_chat_title(user_message: str) -> Optional[str]:
+    """
+    Title a short, topic-named message locally from its topic words (e.g. "show the sales dashboard" -> "📊 Sales Dashboard")
+    """
+    words = user_message.split()
+    if not words or len(words) > QUICK_TITLE_MAX_WORDS:
+        return None
+    topics = []
+    for word in words:
+        topic = word.lower().strip(string.punctuation)
+        if topic in QUICK_TITLE_EMOJIS and topic not in topics:
+            topics.append(topic)
+    if not topics:
+        return None
+    return f"{QUICK_TITLE_EMOJIS[topics[0]]} {' '.join(topic[:1].upper() + topic[1:] for topic in topics)}"
+
 @app.post("/api/chat/generate-title")
 async def generate_chat_title(request: ChatTitleRequest):
     """
     Generate an emoji + short title for a chat based on the user's first message
     """
+    cache_key = request.user_message[:CHAT_TITLE_CACHE_KEY_CHARS]
+    cached_title = chat_title_cache.get(cache_key)
+    if cached_title is not None:
+        return {"title": cached_title}
+    
+    quick_title = quick_chat_title(request.user_message)
+    if quick_title is not None:
+        chat_title_cache[cache_key] = quick_title
+        return {"title": quick_title}
+    
     if not anthropic_client:
         raise HTTPException(status_code=500, detail="Anthropic API key not configured")
     
@@ -440,12 +878,16 @@ Your response:"""
         )
         
         title = response.content[0].text.strip()
+        chat_title_cache[cache_key] = title
         return {"title": title}
         
     except Exception as e:
         # Return a fallback title
         return {"title": "💬 New Chat"}
 
+# Pre-encoded error line for the unconfigured-key path
+API_KEY_MISSING_LINE = orjson.dumps({"type": "error", "error": "Anthropic API key not configured"}, option=orjson.OPT_APPEND_NEWLINE)
+
 @app.post("/api/chat/stream")
 async def stream_chat(request: CanvasUpdateRequest):
     """
@@ -462,7 +904,7 @@ async def stream_chat(request: CanvasUpdateRequest):
     
     if not anthropic_client:
         return StreamingResponse(
-            iter([json.dumps({"type": "error", "error": "Anthropic API key not configured"}).encode() + b"\n"]),
+            iter([API_KEY_MISSING_LINE]),
             media_type="text/plain"
         )
     
@@ -471,193 +913,348 @@ async def stream_chat(request: CanvasUpdateRequest):
         media_type="text/plain"
     )
 
+# Tools Claude can use while chatting - identical for every request
+CANVAS_TOOLS = [
+    {
+        "name": "edit_canvas",
+        "description": "Edit the canvas by modifying its JSON structure. Use this to add, remove, or modify nodes and edges on the canvas.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "canvas_json": {
+                    "type": "object",
+                    "description": "The complete new canvas JSON structure with nodes and edges"
+                },
+                "explanation": {
+                    "type": "string",
+                    "description": "Brief explanation of what was changed"
+                }
+            },
+            "required": ["canvas_json", "explanation"]
+        },
+        "cache_control": {"type": "ephemeral"}  # Tool definition never changes - cache it
+    }
+]
+
 async def stream_ai_response(request: CanvasUpdateRequest) -> AsyncIterator[bytes]:
     """
     Generate streaming AI responses with canvas editing
     """
     try:
-        # Build conversation history for Claude
-        claude_messages = []
-        for msg in request.messages:
-            claude_messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        # Conversation history is already validated as plain {"role", "content"} dicts
+        claude_messages = request.messages
+        if claude_messages:
+            # Cache breakpoint on the newest turn - the next turn reuses the whole history prefix
+            last_message = claude_messages[-1]
+            claude_messages = [*claude_messages[:-1], {
+                "role": last_message["role"],
+                "content": [{"type": "text", "text": last_message["content"], "cache_control": {"type": "ephemeral"}}],
+            }]
         
-        # Build system prompt with context
-        system_prompt = build_system_prompt(request.current_canvas, request.data_sources)
+        # Build system prompt with context (off the event loop - raw files may need parsing)
+        system_prompt = await asyncio.to_thread(build_system_prompt, request.current_canvas, request.data_sources)
         
-        # Define tools that Claude can use
-        tools = [
-            {
-                "name": "edit_canvas",
-                "description": "Edit the canvas by modifying its JSON structure. Use this to add, remove, or modify nodes and edges on the canvas.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "canvas_json": {
-                            "type": "string",
-                            "description": "The complete new canvas JSON structure with nodes and edges"
-                        },
-                        "explanation": {
-                            "type": "string",
-                            "description": "Brief explanation of what was changed"
-                        }
-                    },
-                    "required": ["canvas_json", "explanation"]
-                }
-            }
-        ]
+        # Replay identical requests (same prompt and history - tools are constant) from the response cache
+        cache_key = hashlib.blake2b(
+            orjson.dumps({"system": system_prompt, "messages": claude_messages}, option=orjson.OPT_SORT_KEYS),
+            digest_size=16
+        ).hexdigest()
+        cached_stream = None if request.regenerate else chat_response_cache.get(cache_key)
+        if cached_stream is not None:
+            yield cached_stream
+            return
         
-        # Start streaming from Claude
-        async with anthropic_client.messages.stream(
-            model="claude-haiku-4-5",  # Latest Claude model
-            max_tokens=30000,  # Increased for complex canvas operations
-            system=system_prompt,
-            messages=claude_messages,
-            tools=tools,
-            temperature=0.7,
-        ) as stream:
+        recorded_lines = []
+        async for line in decouple_stream(batch_stream_lines(stream_claude_events(system_prompt, claude_messages, CANVAS_TOOLS, request.username))):
+            recorded_lines.append(line)
+            yield line
+        
+        # Only streams that finished cleanly are replayed, with a zero-usage done line
+        replay = build_cached_replay(b"".join(recorded_lines))
+        if replay is not None:
+            chat_response_cache[cache_key] = replay
+        
+    except Exception as e:
+        logger.exception("[Python API] Chat stream failed")
+        yield orjson.dumps({
+            "type": "error",
+            "error": str(e)
+        }, option=orjson.OPT_APPEND_NEWLINE)
+
+# text_delta is the highest-frequency event - only the text itself needs encoding
+TEXT_DELTA_PREFIX = b'{"type":"text_delta","text":'
+TEXT_DELTA_SUFFIX = b'}\n'
+
+# Envelopes that never change are encoded once at import
+TOOL_START_EDIT_CANVAS_LINE = orjson.dumps({
+    "type": "tool_start",
+    "tool_name": "edit_canvas",
+    "message": "🔧 Editing canvas..."
+}, option=orjson.OPT_APPEND_NEWLINE)
+TOOL_FINISH_EDIT_CANVAS_LINE = orjson.dumps({
+    "type": "tool_finish",
+    "tool_name": "edit_canvas"
+}, option=orjson.OPT_APPEND_NEWLINE)
+DONE_PREFIX = b'{"type":"done","usage":'
+DONE_STOP_REASON = b',"stop_reason":'
+DONE_SUFFIX = b'}\n'
+ERROR_LINE_PREFIX = b'{"type":"error"'
+
+# Replayed responses cost nothing - the done line reports zero usage and cached=true
+CACHED_REPLAY_USAGE = {
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "cache_read_input_tokens": 0,
+}
+
+def build_cached_replay(recorded: bytes) -> Optional[bytes]:
+    """
+    Turn a recorded chat stream into the bytes replayed on a cache hit
+    
+    Returns None unless the stream ended with a done line, wasn't cut off at
+    max_tokens and contains no error line - those are worth a fresh attempt.
+    """
+    lines = recorded.splitlines(keepends=True)
+    if not lines or not lines[-1].startswith(DONE_PREFIX):
+        return None
+    if any(line.startswith(ERROR_LINE_PREFIX) for line in lines):
+        return None
+    done = orjson.loads(lines[-1])
+    if done.get("stop_reason") == "max_tokens":
+        return None
+    return b"".join(lines[:-1]) + orjson.dumps({
+        "type": "done",
+        "usage": CACHED_REPLAY_USAGE,
+        "stop_reason": done.get("stop_reason"),
+        "cached": True,
+    }, option=orjson.OPT_APPEND_NEWLINE)
+
+# text_delta lines are coalesced into one write until either limit is hit
+STREAM_BATCH_MAX_BYTES = 4096
+STREAM_BATCH_MAX_DELAY_SECONDS = 0.015
+
+async def batch_stream_lines(lines: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Coalesce text_delta lines into fewer, larger writes
+    
+    Any other event (tool_start, canvas_update, done, error...) flushes the
+    buffer immediately, and buffered text never waits longer than
+    STREAM_BATCH_MAX_DELAY_SECONDS even if Claude pauses.
+    """
+    loop = asyncio.get_running_loop()
+    buffer = bytearray()
+    flush_deadline = 0.0
+    iterator = lines.__aiter__()
+    next_line = asyncio.ensure_future(iterator.__anext__())
+    
+    try:
+        while True:
+            timeout = max(0.0, flush_deadline - loop.time()) if buffer else None
+            done, _ = await asyncio.wait({next_line}, timeout=timeout)
             
-            # Track tool usage
-            current_tool_use = None
-            tool_input_buffer = ""
+            if not done:
+                # Deadline passed while waiting for the next event
+                yield bytes(buffer)
+                buffer.clear()
+                continue
             
-            async for event in stream:
-                
-                # Text streaming
-                if event.type == "content_block_start":
-                    if hasattr(event, 'content_block') and event.content_block.type == "text":
-                        # Starting to stream text
-                        pass
-                    elif hasattr(event, 'content_block') and event.content_block.type == "tool_use":
-                        # Starting tool use
-                        current_tool_use = event.content_block.name
-                        tool_input_buffer = ""
-                        yield (json.dumps({
+            try:
+                line = next_line.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                if buffer:
+                    yield bytes(buffer)
+                raise
+            next_line = asyncio.ensure_future(iterator.__anext__())
+            
+            if not buffer:
+                flush_deadline = loop.time() + STREAM_BATCH_MAX_DELAY_SECONDS
+            buffer += line
+            
+            if (not line.startswith(TEXT_DELTA_PREFIX)
+                    or len(buffer) >= STREAM_BATCH_MAX_BYTES
+                    or loop.time() >= flush_deadline):
+                yield bytes(buffer)
+                buffer.clear()
+        
+        if buffer:
+            yield bytes(buffer)
+    finally:
+        if not next_line.done():
+            next_line.cancel()
+
+# Chunks Claude's stream may run ahead of a slow client before it waits
+STREAM_QUEUE_MAX_CHUNKS = 256
+
+async def decouple_stream(lines: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Read lines in a background task so a slow client doesn't throttle the Anthropic stream
+    
+    The producer pushes into a bounded queue (None marks the end, an exception
+    is re-raised here); closing this generator cancels the producer.
+    """
+    line_queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_MAX_CHUNKS)
+    
+    async def produce():
+        try:
+            async for line in lines:
+                await line_queue.put(line)
+        except Exception as e:
+            await line_queue.put(e)
+        else:
+            await line_queue.put(None)
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while (item := await line_queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+
+async def stream_claude_events(system_prompt: List[Dict[str, Any]], claude_messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], username: str) -> AsyncIterator[bytes]:
+    """
+    Stream Claude's response as JSON lines, applying canvas edits from tool use
+    """
+    # Start streaming from Claude
+    async with anthropic_client.messages.stream(
+        model="claude-haiku-4-5",  # Latest Claude model
+        max_tokens=30000,  # Increased for complex canvas operations
+        system=system_prompt,
+        messages=claude_messages,
+        tools=tools,
+        temperature=0.7,
+    ) as stream:
+        
+        # Track tool usage - partial JSON chunks are joined once when the block ends
+        current_tool_use = None
+        tool_input_chunks: List[str] = []
+        
+        async for event in stream:
+            
+            # Text streaming
+            if event.type == "content_block_start":
+                if event.content_block.type == "text":
+                    # Starting to stream text
+                    pass
+                elif event.content_block.type == "tool_use":
+                    # Starting tool use
+                    current_tool_use = event.content_block.name
+                    tool_input_chunks = []
+                    if current_tool_use == "edit_canvas":
+                        yield TOOL_START_EDIT_CANVAS_LINE
+                    else:
+                        yield orjson.dumps({
                             "type": "tool_start",
                             "tool_name": current_tool_use,
                             "message": f"🔧 Editing canvas..."
-                        }) + "\n").encode()
+                        }, option=orjson.OPT_APPEND_NEWLINE)
+            
+            elif event.type == "content_block_delta":
+                if event.delta.type == "text_delta":
+                    # Stream text token by token
+                    yield TEXT_DELTA_PREFIX + orjson.dumps(event.delta.text) + TEXT_DELTA_SUFFIX
                 
-                elif event.type == "content_block_delta":
-                    if hasattr(event.delta, 'text'):
-                        # Stream text token by token
-                        yield (json.dumps({
-                            "type": "text_delta",
-                            "text": event.delta.text
-                        }) + "\n").encode()
+                elif event.delta.type == "input_json_delta":
+                    # Accumulate tool input JSON
+                    tool_input_chunks.append(event.delta.partial_json)
+            
+            elif event.type == "content_block_stop":
+                if current_tool_use == "edit_canvas" and tool_input_chunks:
+                    # Tool finished - parse and send canvas update
+                    for line in build_canvas_update_events("".join(tool_input_chunks)):
+                        yield line
                     
-                    elif hasattr(event.delta, 'partial_json'):
-                        # Accumulate tool input JSON
-                        tool_input_buffer += event.delta.partial_json
+                    current_tool_use = None
+                    tool_input_chunks = []
+                else:
+                    pass
+            
+            elif event.type == "message_stop":
+                # Handle any remaining tool use before finishing
+                if current_tool_use == "edit_canvas" and tool_input_chunks:
+                    # Tool wasn't properly finished - process it now
+                    for line in build_canvas_update_events("".join(tool_input_chunks)):
+                        yield line
                 
-                elif event.type == "content_block_stop":
-                    if current_tool_use == "edit_canvas" and tool_input_buffer:
-                        # Tool finished - parse and send canvas update
-                        try:
-                            tool_input = json.loads(tool_input_buffer)
-                            canvas_json = tool_input.get("canvas_json", "")
-                            explanation = tool_input.get("explanation", "")
-                            
-                            # Validate it's valid JSON
-                            json.loads(canvas_json)
-                            
-                            yield (json.dumps({
-                                "type": "canvas_update",
-                                "canvas": canvas_json,
-                                "explanation": explanation
-                            }) + "\n").encode()
-                            
-                            yield (json.dumps({
-                                "type": "tool_finish",
-                                "tool_name": "edit_canvas"
-                            }) + "\n").encode()
-                            
-                        except json.JSONDecodeError as e:
-                            yield (json.dumps({
-                                "type": "error",
-                                "error": f"Invalid canvas JSON: {str(e)}"
-                            }) + "\n").encode()
-                        
-                        current_tool_use = None
-                        tool_input_buffer = ""
-                    else:
-                        pass
+                # Stream complete
+                final_msg = await stream.get_final_message()
+                usage = {
+                    "input_tokens": final_msg.usage.input_tokens,
+                    "output_tokens": final_msg.usage.output_tokens,
+                    "cache_creation_input_tokens": final_msg.usage.cache_creation_input_tokens or 0,
+                    "cache_read_input_tokens": final_msg.usage.cache_read_input_tokens or 0,
+                }
+                # Track token usage for this chat interaction
+                schedule_token_tracking(
+                    username,
+                    usage["input_tokens"],
+                    usage["output_tokens"],
+                    usage["cache_creation_input_tokens"],
+                    usage["cache_read_input_tokens"]
+                )
                 
-                elif event.type == "message_stop":
-                    # Handle any remaining tool use before finishing
-                    if current_tool_use == "edit_canvas" and tool_input_buffer:
-                        # Tool wasn't properly finished - process it now
-                        try:
-                            tool_input = json.loads(tool_input_buffer)
-                            canvas_json = tool_input.get("canvas_json", "")
-                            explanation = tool_input.get("explanation", "")
-                            
-                            # Validate it's valid JSON
-                            json.loads(canvas_json)
-                            
-                            yield (json.dumps({
-                                "type": "canvas_update",
-                                "canvas": canvas_json,
-                                "explanation": explanation
-                            }) + "\n").encode()
-                            
-                            yield (json.dumps({
-                                "type": "tool_finish",
-                                "tool_name": "edit_canvas"
-                            }) + "\n").encode()
-                            
-                        except json.JSONDecodeError as e:
-                            yield (json.dumps({
-                                "type": "error",
-                                "error": f"Invalid canvas JSON: {str(e)}"
-                            }) + "\n").encode()
-                    
-                    # Stream complete
-                    usage = {}
-                    if hasattr(stream, 'get_final_message'):
-                        final_msg = await stream.get_final_message()
-                        if hasattr(final_msg, 'usage'):
-                            usage = {
-                                "input_tokens": final_msg.usage.input_tokens,
-                                "output_tokens": final_msg.usage.output_tokens,
-                            }
-                            # Track token usage for this chat interaction
-                            await track_token_usage(
-                                request.username,
-                                final_msg.usage.input_tokens,
-                                final_msg.usage.output_tokens
-                            )
-                    
-                    yield (json.dumps({
-                        "type": "done",
-                        "usage": usage
-                    }) + "\n").encode()
+                yield DONE_PREFIX + orjson.dumps(usage) + DONE_STOP_REASON + orjson.dumps(final_msg.stop_reason) + DONE_SUFFIX
+
+def build_canvas_update_events(tool_input_buffer: str) -> List[bytes]:
+    """
+    Turn the buffered edit_canvas tool input into canvas_update + tool_finish lines
+    
+    The tool input is parsed once; canvas_json arrives as an object and is
+    re-encoded to the string form the frontend stores.
+    """
+    try:
+        tool_input = orjson.loads(tool_input_buffer)
+        canvas = tool_input.get("canvas_json", {})
+        explanation = tool_input.get("explanation", "")
         
-    except Exception as e:
-        yield (json.dumps({
+        if isinstance(canvas, str):
+            # Model sent the canvas as a nested JSON string - validate it
+            orjson.loads(canvas)
+            canvas_json = canvas
+        else:
+            canvas_json = orjson.dumps(canvas).decode()
+        
+        return [
+            orjson.dumps({
+                "type": "canvas_update",
+                "canvas": canvas_json,
+                "explanation": explanation
+            }, option=orjson.OPT_APPEND_NEWLINE),
+            TOOL_FINISH_EDIT_CANVAS_LINE,
+        ]
+        
+    except json.JSONDecodeError as e:
+        return [orjson.dumps({
             "type": "error",
-            "error": str(e)
-        }) + "\n").encode()
+            "error": f"Invalid canvas JSON: {str(e)}"
+        }, option=orjson.OPT_APPEND_NEWLINE)]
 
-def build_system_prompt(current_canvas: str, data_sources: List[Dict[str, Any]]) -> str:
+def build_system_prompt(current_canvas: str, data_sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Build system prompt with context about canvas and data sources
+    Build system prompt blocks: cached static instructions + per-turn canvas and data context
     """
     
     # Parse canvas to understand current state
     try:
-        canvas_obj = json.loads(current_canvas)
+        canvas_obj = orjson.loads(current_canvas)
         node_count = len(canvas_obj.get("nodes", []))
         edge_count = len(canvas_obj.get("edges", []))
-    except:
+    except (orjson.JSONDecodeError, AttributeError, TypeError):
+        # Unparseable or non-object canvas - still sent verbatim below
         node_count = 0
         edge_count = 0
     
-    # Summarize data sources
+    # Single pass over data sources: summary line, raw file data (ONLY if enabled) and FULL subset data
     data_summary = []
+    full_raw_data = []
+    full_subsets_data = []
     for ds in data_sources:
+        file_id = ds.get("_id", "unknown")
         file_name = ds.get("originalFileName", "Unknown")
         schema = ds.get("fileSchema", {})
         columns = schema.get("columns", [])
@@ -667,12 +1264,8 @@ def build_system_prompt(current_canvas: str, data_sources: List[Dict[str, Any]])
         data_summary.append(
             f"- {file_name}: {len(columns)} columns, {row_count} rows, {len(subsets)} pre-generated visualizations"
         )
-    
-    # Parse raw file data and include FULL spreadsheet data (ONLY if enabled)
-    full_raw_data = []
-    if INCLUDE_RAW_FILE_DATA:
-        for ds in data_sources:
-            file_name = ds.get("originalFileName", "Unknown")
+        
+        if INCLUDE_RAW_FILE_DATA:
             raw_file_data = ds.get("rawFileData")
             
             if raw_file_data:
@@ -680,46 +1273,7 @@ def build_system_prompt(current_canvas: str, data_sources: List[Dict[str, Any]])
                 file_type = raw_file_data.get("fileType", "")
                 
                 if file_buffer:
-                    try:
-                        import pandas as pd
-                        
-                        # Decode base64 buffer
-                        file_bytes = base64.b64decode(file_buffer)
-                        
-                        full_raw_data.append(f"\n**RAW FILE DATA: {file_name}**")
-                        
-                        # Parse based on file type
-                        if 'csv' in file_type.lower() or file_name.lower().endswith('.csv'):
-                            df = pd.read_csv(io.BytesIO(file_bytes))
-                            full_raw_data.append(f"Format: CSV")
-                            full_raw_data.append(f"Rows: {len(df)}, Columns: {len(df.columns)}")
-                            full_raw_data.append(f"Column Names: {list(df.columns)}")
-                            full_raw_data.append(f"\nFULL DATA (all {len(df)} rows):")
-                            full_raw_data.append(df.to_json(orient='records', date_format='iso'))
-                            
-                        elif 'excel' in file_type.lower() or 'spreadsheet' in file_type.lower() or file_name.lower().endswith(('.xlsx', '.xls')):
-                            # Read all sheets
-                            sheets_dict = pd.read_excel(io.BytesIO(file_bytes), sheet_name=None)
-                            
-                            full_raw_data.append(f"Format: Excel")
-                            full_raw_data.append(f"Total Sheets: {len(sheets_dict)}")
-                            
-                            for sheet_name, sheet_df in sheets_dict.items():
-                                full_raw_data.append(f"\n--- SHEET: {sheet_name} ---")
-                                full_raw_data.append(f"Rows: {len(sheet_df)}, Columns: {len(sheet_df.columns)}")
-                                full_raw_data.append(f"Column Names: {list(sheet_df.columns)}")
-                                full_raw_data.append(f"\nFULL DATA (all {len(sheet_df)} rows):")
-                                full_raw_data.append(sheet_df.to_json(orient='records', date_format='iso'))
-                            
-                    except Exception as e:
-                        full_raw_data.append(f"Error parsing raw data: {str(e)}")
-    
-    # Include FULL data from ALL subsets in context
-    full_subsets_data = []
-    for ds in data_sources:
-        file_id = ds.get("_id", "unknown")
-        file_name = ds.get("originalFileName", "Unknown")
-        subsets = ds.get("subsets", [])
+                    full_raw_data.append(render_raw_file_data(file_name, file_type, file_buffer))
         
         if subsets:
             full_subsets_data.append(f"\n**File: {file_name} (ID: {file_id})**")
@@ -738,11 +1292,101 @@ def build_system_prompt(current_canvas: str, data_sources: List[Dict[str, Any]])
                 full_subsets_data.append(f"Description: {desc}")
                 full_subsets_data.append(f"X-Axis: {x_axis} ({x_axis_desc})")
                 full_subsets_data.append(f"Y-Axis: {y_axis} ({y_axis_desc})")
-                full_subsets_data.append(f"Data Points ({len(data_points)} total):")
-                full_subsets_data.append(json.dumps(data_points, indent=2))
+                if len(data_points) <= SUBSET_PROMPT_MAX_POINTS:
+                    full_subsets_data.append(f"Data Points ({len(data_points)} total):")
+                    full_subsets_data.append(orjson.dumps(data_points).decode())
+                else:
+                    # Oversized subset - first and last points only
+                    head_count = SUBSET_PROMPT_MAX_POINTS - SUBSET_PROMPT_TAIL_POINTS
+                    full_subsets_data.append(f"Data Points ({len(data_points)} total, showing first {head_count} and last {SUBSET_PROMPT_TAIL_POINTS}):")
+                    full_subsets_data.append(orjson.dumps(data_points[:head_count]).decode())
+                    full_subsets_data.append(orjson.dumps(data_points[-SUBSET_PROMPT_TAIL_POINTS:]).decode())
                 full_subsets_data.append("")
     
-    system_prompt = f"""You are an AI assistant helping users build data visualizations on a canvas.
+    dynamic_prompt = "".join((
+        "**Current Canvas State:**\n- Nodes: ", str(node_count),
+        "\n- Edges: ", str(edge_count),
+        "\n- Full JSON: ", current_canvas,
+        "\n\n**Available Data Sources:**\n",
+        "\n".join(data_summary) or "No data sources uploaded yet",
+        "\n\n**RAW FILE DATA (ALL SHEETS):**\n",
+        "\n".join(full_raw_data) or RAW_DATA_PLACEHOLDER,
+        "\n\n**Pre-generated Subsets with FULL DATA:**\n",
+        "\n".join(full_subsets_data) or "No subsets available yet",
+    ))
+    
+    return [
+        # Static instructions first so Anthropic can cache the prefix across turns
+        {"type": "text", "text": STATIC_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": dynamic_prompt},
+    ]
+
+def render_raw_file_data(file_name: str, file_type: str, file_buffer: str) -> str:
+    """
+    Decode, parse and serialize one data source's raw file for the system prompt
+    
+    Raw bytes never change between chat turns, so the rendered text is
+    cached by a hash of the base64 buffer.
+    """
+    cache_key = (file_name, file_type, hashlib.blake2b(file_buffer.encode(), digest_size=16).digest())
+    with raw_file_render_lock:
+        cached = raw_file_render_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    lines = [f"\n**RAW FILE DATA: {file_name}**"]
+    try:
+        # Decode base64 buffer (SIMD-accelerated)
+        file_bytes = pybase64.b64decode(file_buffer, validate=False)
+        
+        # Parse based on file type
+        if 'csv' in file_type.lower() or file_name.lower().endswith('.csv'):
+            columns, row_count, head_records, tail_records = read_csv_records(io.BytesIO(file_bytes))
+            lines.append(f"Format: CSV")
+            lines.append(f"Rows: {row_count}, Columns: {len(columns)}")
+            lines.append(f"Column Names: {columns}")
+            if not tail_records:
+                lines.append(f"\nFULL DATA (all {row_count} rows):")
+                lines.append(dumps_for_prompt(head_records))
+            else:
+                lines.append(f"\nSAMPLE DATA (first {RAW_DATA_HEAD_ROWS} of {row_count} rows):")
+                lines.append(dumps_for_prompt(head_records))
+                lines.append(f"\nSAMPLE DATA (last {RAW_DATA_TAIL_ROWS} rows):")
+                lines.append(dumps_for_prompt(tail_records))
+            
+        elif 'excel' in file_type.lower() or 'spreadsheet' in file_type.lower() or file_name.lower().endswith(('.xlsx', '.xls')):
+            # Read all sheets
+            sheets_dict = read_excel_sheets(io.BytesIO(file_bytes))
+            
+            lines.append(f"Format: Excel")
+            lines.append(f"Total Sheets: {len(sheets_dict)}")
+            
+            for sheet_name, sheet_df in sheets_dict.items():
+                lines.append(f"\n--- SHEET: {sheet_name} ---")
+                lines.append(f"Rows: {len(sheet_df)}, Columns: {len(sheet_df.columns)}")
+                lines.append(f"Column Names: {list(sheet_df.columns)}")
+                if len(sheet_df) <= RAW_DATA_MAX_FULL_ROWS:
+                    lines.append(f"\nFULL DATA (all {len(sheet_df)} rows):")
+                    lines.append(sheet_df.to_json(orient='records', date_format='iso'))
+                else:
+                    lines.append(f"\nSAMPLE DATA (first {RAW_DATA_HEAD_ROWS} of {len(sheet_df)} rows):")
+                    lines.append(sheet_df.head(RAW_DATA_HEAD_ROWS).to_json(orient='records', date_format='iso'))
+                    lines.append(f"\nSAMPLE DATA (last {RAW_DATA_TAIL_ROWS} rows):")
+                    lines.append(sheet_df.tail(RAW_DATA_TAIL_ROWS).to_json(orient='records', date_format='iso'))
+            
+    except Exception as e:
+        lines.append(f"Error parsing raw data: {str(e)}")
+    
+    rendered = "\n".join(lines)
+    with raw_file_render_lock:
+        raw_file_render_cache[cache_key] = rendered
+    return rendered
+
+# Shown in place of the raw data section when there is nothing to include
+RAW_DATA_PLACEHOLDER = "No raw data available" if INCLUDE_RAW_FILE_DATA else "Raw file data not included (disabled in configuration)"
+
+# Canvas instructions identical on every chat turn - built once at import
+STATIC_SYSTEM_PROMPT = f"""You are an AI assistant helping users build data visualizations on a canvas.
 
 **YOUR PRIMARY TASK:** Whenever a user asks to add, modify, or remove visualizations, you MUST use the edit_canvas tool to make the changes. Always respond with both text explanation AND canvas edits.
 
@@ -997,20 +1641,6 @@ Total: 6 score cards + 12 charts + title + summary = ~865px (PERFECT!)
 
 **WHEN CREATING REPORTS: Aim for 9-12 charts minimum to create a comprehensive, executive-ready dashboard that fits on one page!**
 
-**Current Canvas State:**
-- Nodes: {node_count}
-- Edges: {edge_count}
-- Full JSON: {current_canvas}
-
-**Available Data Sources:**
-{chr(10).join(data_summary) if data_summary else "No data sources uploaded yet"}
-
-**COMPLETE RAW FILE DATA (ALL SHEETS, ALL ROWS):**
-{chr(10).join(full_raw_data) if full_raw_data else ("Raw file data not included (disabled in configuration)" if not INCLUDE_RAW_FILE_DATA else "No raw data available")}
-
-**Pre-generated Subsets with FULL DATA:**
-{chr(10).join(full_subsets_data) if full_subsets_data else "No subsets available yet"}
-
 **━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━**
 **🎨 DESIGN SYSTEM - COGNIVO PLATFORM**
 **━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━**
@@ -1168,7 +1798,7 @@ Score cards are perfect for displaying key metrics with visual change indicators
 **IMPORTANT RULES:**
 1. **CREATE MANY GRAPHS**: For general requests, create 10-15+ charts. For reports, create 8-12+ charts in dense rows
 2. **Embed data**: ALWAYS include the full "data" array with all data points in the chart node
-3. **Data access**: {"You have the COMPLETE raw spreadsheet data (all sheets, all rows) provided above in COMPLETE RAW FILE DATA section" if INCLUDE_RAW_FILE_DATA else "Use the pre-generated subsets provided above - they contain aggregated and processed data ready for visualization"}
+3. **Data access**: {f"You have the raw spreadsheet data (all sheets) provided below in the RAW FILE DATA section - sheets with more than {RAW_DATA_MAX_FULL_ROWS} rows are shown as a head/tail sample, so use the pre-generated subsets for totals over those" if INCLUDE_RAW_FILE_DATA else "Use the pre-generated subsets provided below - they contain aggregated and processed data ready for visualization"}
 4. **Use available data**: {"You can transform and use the raw data directly, or use the pre-generated subsets - you have everything!" if INCLUDE_RAW_FILE_DATA else "Use the pre-generated subsets which contain carefully selected data perspectives optimized for different chart types"}
 5. **Sheets availability**: {"For Excel files, ALL sheets are provided separately - you can create visualizations from ANY sheet" if INCLUDE_RAW_FILE_DATA else "Pre-generated subsets may include data from multiple sheets where applicable"}
 6. **Data transformations**: {"You can aggregate, filter, group, or transform the raw data however you want before creating visualizations" if INCLUDE_RAW_FILE_DATA else "Use the pre-generated subsets which are already aggregated and processed for optimal visualization"}
@@ -1349,8 +1979,6 @@ You should create score cards in a row:
 **━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━**
 
 Be creative, helpful, and make beautiful, COMPREHENSIVE visualizations with ALL data embedded!"""
-    
-    return system_prompt
 
 # ============================================
 # Run the server
@@ -1360,10 +1988,20 @@ if __name__ == "__main__":
     # Get port from environment variable or use default
     port = int(os.getenv("PYTHON_API_PORT", "8000"))
     
+    # Dev default is a single auto-reloading worker; set PYTHON_API_RELOAD=false to run
+    # PYTHON_API_WORKERS processes (caches are per process)
+    reload = os.getenv("PYTHON_API_RELOAD", "true").lower() in ("true", "1", "yes")
+    workers = int(os.getenv("PYTHON_API_WORKERS", "1"))
+    access_log = os.getenv("PYTHON_API_ACCESS_LOG", "true").lower() in ("true", "1", "yes")
+    
     uvicorn.run(
         "main:app",
         host="127.0.0.1",
         port=port,
-        reload=True,  # Auto-reload on code changes
+        reload=reload,  # Auto-reload on code changes
+        workers=None if reload else workers,
+        access_log=access_log,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",  # uvloop is not available on Windows
+        http="httptools",  # C HTTP parser (installed with uvicorn[standard])
         log_level="info"
     )
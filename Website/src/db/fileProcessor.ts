@@ -68,20 +68,19 @@ async function callPythonAPIForProcessing(
   username: string
 ): Promise<{ success: boolean; data?: FileProcessingResult; error?: string }> {
   try {
-    // Convert buffer to base64 for transmission
-    const base64Buffer = fileBuffer.toString('base64');
+    // Stream raw bytes to Python; metadata travels as query params
+    const params = new URLSearchParams({
+      fileName: fileName,
+      fileType: fileType,
+      username: username,  // Pass username for token tracking
+    });
     
-    const response = await fetch(`${PYTHON_API_URL}/api/process-file`, {
+    const response = await fetch(`${PYTHON_API_URL}/api/process-file?${params.toString()}`, {
       method: 'POST',
       headers: {
-        'Content-Type': 'application/json',
+        'Content-Type': 'application/octet-stream',
       },
-      body: JSON.stringify({
-        fileBuffer: base64Buffer,
-        fileName: fileName,
-        fileType: fileType,
-        username: username,  // Pass username for token tracking
-      }),
+      body: fileBuffer,
     });
     
     if (!response.ok) {
@@ -162,9 +161,8 @@ function delay(ms: number): Promise<void> {
 // Location: python-api/main.py
 // 
 // The Python API endpoint /api/process-file will receive:
-// - fileBuffer (base64 encoded file)
-// - fileName
-// - fileType
+// - raw file bytes as the request body (application/octet-stream)
+// - fileName, fileType, username as query params
 //
 // It should return:
 // - schema: { columns, rowCount, summary }